@@ -16,14 +16,20 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """Python library to convert between Taskwarrior and iCalendar."""
 
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
 from datetime import datetime, time, timedelta, timezone
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import chain
 from json import dumps, loads
-from os.path import basename, exists, getmtime, join
-from re import findall
+from operator import itemgetter
+from os import stat
+from os.path import basename, exists, join
+from re import compile as re_compile
 from socket import getfqdn
 from subprocess import check_call, check_output
 from threading import Lock
+from time import monotonic
 from typing import Any
 from zoneinfo import ZoneInfo
 
@@ -31,6 +37,53 @@ from dateutil import rrule, tz
 
 from vobject import iCalendar
 from vobject.base import Component, readOne
+from vobject.icalendar import TimezoneComponent
+
+_DATA_LOCATION = re_compile(r"data\.location=(.*)")
+_F4_ATTRIBUTE = re_compile(r'(\w+):"((?:\\.|[^"\\])*)"')
+_IMPORT_UUID = re_compile(
+    "(?:add|mod)  ([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}) "
+)
+_F4_DATES = ("due", "end", "entry", "modified", "scheduled", "start", "until", "wait")
+_RECUR_PERIOD = re_compile(r"\s*([+-]?\d+)\s*([a-z]+)")
+_RECUR_NAMES = {
+    "daily": rrule.DAILY,
+    "weekly": rrule.WEEKLY,
+    "monthly": rrule.MONTHLY,
+    "yearly": rrule.YEARLY,
+}
+_RECUR_UNITS = {
+    "days": rrule.DAILY,
+    "w": rrule.WEEKLY,
+    "week": rrule.WEEKLY,
+    "weeks": rrule.WEEKLY,
+    "mo": rrule.MONTHLY,
+    "month": rrule.MONTHLY,
+    "months": rrule.MONTHLY,
+    "y": rrule.YEARLY,
+    "year": rrule.YEARLY,
+    "years": rrule.YEARLY,
+}
+_TW_DATES = (
+    ("dtstamp", "entry"),
+    ("last-modified", "modified"),
+    ("dtstart", "start"),
+    ("due", "due"),
+    ("completed", "end"),
+)
+_ICS_PRIORITIES = {"H": "1", "M": "5", "L": "9"}
+_ICS_STATUSES = {
+    "pending": "NEEDS-ACTION",
+    "waiting": "NEEDS-ACTION",
+    "completed": "COMPLETED",
+    "deleted": "CANCELLED",
+}
+_TW_STATUSES = {
+    "IN-PROCESS": "pending",
+    "NEEDS-ACTION": "pending",
+    "COMPLETED": "completed",
+    "CANCELLED": "deleted",
+}
 
 
 class IcsTask:
@@ -50,62 +103,218 @@ class IcsTask:
         """
         if not data_location:
             out = check_output(["task", "rc.confirmation=no", "_show"], text=True)
-            self._data_location = findall("data.location=(.*)", out)[0]
+            match = _DATA_LOCATION.search(out)
+            if not match:
+                raise ValueError("No data.location in the Taskwarrior configuration")
+            self._data_location = match[1]
         else:
             self._data_location = data_location
         self._localtz = localtz or tz.gettz()
+        # tasks often share timestamps, the timezone is fixed per instance
+        self._ics_datetimes: dict[str, datetime] = {}
         self._task_projects = task_projects or []
         self._start_task = start_task
         self._lock = Lock()
         self._mtime = 0.0
-        self._fqdn = fqdn or getfqdn()
+        self._last_check = 0.0
+        self._check_interval = 0.05
+        self._file_mtimes = {"pending.data": 0.0, "completed.data": 0.0}
+        self._file_sizes = {fname: 0 for fname in self._file_mtimes}
+        self._file_digests = {fname: b"" for fname in self._file_mtimes}
+        self._file_tasks: dict[str, dict[str, dict[str, Any]]] = {
+            fname: {} for fname in self._file_mtimes
+        }
+        self._uid_suffix = f"@{fqdn or getfqdn()}"
         self._tasks: dict[str, dict[str, Any]] = {}
+        self._tasks_by_uuid: dict[str, dict[str, Any]] = {}
+        # UID and file name lists derived from the tasks, reset on reload
+        self._lists: dict[tuple[str, str], list[str]] = {}
         self._update()
 
+    def _data_mtimes(self) -> dict[str, float]:
+        """Return the mtimes of the Taskwarrior data files, 0.0 if missing."""
+        mtimes = {}
+        for fname in self._file_mtimes:
+            try:
+                mtimes[fname] = stat(join(self._data_location, fname)).st_mtime
+            except FileNotFoundError:
+                mtimes[fname] = 0.0
+        return mtimes
+
+    def _outdated(self, mtimes: dict[str, float]) -> bool:
+        return any(mtime != self._file_mtimes[fname] for fname, mtime in mtimes.items())
+
     def _update(self) -> None:
-        """Reload Taskwarrior files if the mtime is newer."""
-        update = False
+        """Reload Taskwarrior files if their mtime changed.
 
-        with self._lock:
-            for fname in ("pending.data", "completed.data"):
-                data_file = join(self._data_location, fname)
-                if exists(data_file):
-                    mtime = getmtime(data_file)
-                    if mtime > self._mtime:
-                        self._mtime = mtime
-                        update = True
-
-            if update:
-                self._tasks = {}
-                out = check_output(
-                    [
-                        "task",
-                        "rc.verbose=nothing",
-                        "rc.hooks=off",
-                        f"rc.data.location={self._data_location}",
-                        "export",
-                    ],
-                    text=True,
+        Calls within _check_interval seconds of the last completed check are
+        skipped, writes through this class reload on their own.
+        """
+        now = monotonic()
+        if now - self._last_check < self._check_interval:
+            return
+
+        # the mtimes stay outdated until a running reload is done, so callers
+        # wait for it here and _reload() finds nothing left to read
+        if self._outdated(self._data_mtimes()):
+            with self._lock:
+                self._reload()
+        # only skip checks once the data is current
+        self._last_check = now
+
+    def _reload(self, force: bool = False) -> None:
+        """Reload the changed Taskwarrior files, the caller holds self._lock.
+
+        force -- check the content of all files, the mtime may not have changed
+        """
+        mtimes = self._data_mtimes()
+        changed = [
+            fname
+            for fname, mtime in mtimes.items()
+            if force or mtime != self._file_mtimes[fname]
+        ]
+
+        # a new mtime does not imply new content (touch, checkout, sync)
+        reload = False
+        for fname in changed:
+            try:
+                size, digest, tasks = IcsTask._read_data_file(
+                    join(self._data_location, fname),
+                    self._file_tasks[fname],
+                    self._file_sizes[fname],
+                    self._file_digests[fname],
+                )
+            except FileNotFoundError:
+                # a removed file has no tasks left
+                size, digest, tasks = 0, b"", {}
+            if digest != self._file_digests[fname]:
+                self._file_sizes[fname] = size
+                self._file_digests[fname] = digest
+                self._file_tasks[fname] = tasks
+                reload = True
+        if reload:
+            self._swap_tasks()
+
+        # _update() checks the mtimes without the lock, only publish them
+        # once the tasks read from the files are in place
+        self._file_mtimes.update(mtimes)
+        self._mtime = max(self._file_mtimes.values())
+
+    def _swap_tasks(self) -> None:
+        """Rebuild the task indexes from the parsed data files."""
+        projects: dict[str, dict[str, Any]] = {}
+        tasks_by_uuid = {}
+        for tasklist in self._file_tasks.values():
+            for task in tasklist.values():
+                project = task["project"] if "project" in task else "unaffiliated"
+                if project not in projects:
+                    projects[project] = {}
+                projects[project][task["uuid"]] = task
+                tasks_by_uuid[task["uuid"]] = task
+        self._tasks = projects
+        self._tasks_by_uuid = tasks_by_uuid
+        self._lists = {}
+
+    @staticmethod
+    def _read_data_file(
+        data_file: str,
+        known: dict[str, dict[str, Any]],
+        known_size: int,
+        known_digest: bytes,
+    ) -> tuple[int, bytes, dict[str, dict[str, Any]]]:
+        """Parse a Taskwarrior data file (FF4) into the format of task export.
+
+        Returns the size and BLAKE2b digest of the file and the tasks keyed by
+        their FF4 line. Lines found in known are unchanged since the last read
+        and are not parsed again. Taskwarrior mostly appends to its data files,
+        if the file still starts with the known content only the lines after
+        it are looked at.
+        """
+        digest = blake2b()
+        tasks = {}
+        with open(data_file, "rb") as data:
+            if known_size:
+                remaining = known_size
+                chunk = b""
+                while remaining and (chunk := data.read(min(remaining, 65536))):
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+                if (
+                    not remaining
+                    and chunk.endswith(b"\n")
+                    and digest.digest() == known_digest
+                ):
+                    tasks = dict(known)
+                else:
+                    digest = blake2b()
+                    data.seek(0)
+            for raw in data:
+                digest.update(raw)
+                line = raw.decode("utf-8")
+                if line.startswith("["):
+                    tasks[line] = (
+                        known[line] if line in known else IcsTask._parse_f4(line)
+                    )
+            size = data.tell()
+        return size, digest.digest(), tasks
+
+    @staticmethod
+    def _parse_f4(line: str) -> dict[str, Any]:
+        task: dict[str, Any] = {}
+        annotations = []
+        for key, raw in _F4_ATTRIBUTE.findall(line):
+            # only values with JSON escapes need the decoder
+            value = loads(f'"{raw}"', strict=False) if "\\" in raw else raw
+            if "&" in value:
+                value = value.replace("&open;", "[").replace("&close;", "]")
+            if key.startswith("annotation_"):
+                annotations.append(
+                    {"entry": IcsTask._f4_timestamp(key[11:]), "description": value}
                 )
-                tasklist = loads(out)
-                for task in tasklist:
-                    project = task["project"] if "project" in task else "unaffiliated"
-                    if project not in self._tasks:
-                        self._tasks[project] = {}
-                    self._tasks[project][task["uuid"]] = task
+            elif key in _F4_DATES:
+                task[key] = IcsTask._f4_timestamp(value)
+            elif key == "tags":
+                task[key] = value.split(",")
+            else:
+                task[key] = value
+        if annotations:
+            task["annotations"] = annotations
+        return task
+
+    @staticmethod
+    def _f4_timestamp(epoch: str) -> str:
+        return IcsTask._tw_timestamp(datetime.fromtimestamp(int(epoch), timezone.utc))
 
     def _gen_uid(self, uuid: str) -> str:
-        return f"{uuid}@{self._fqdn}"
+        return uuid + self._uid_suffix
 
     def _ics_datetime(self, string: str) -> datetime:
-        dtime = datetime.strptime(string, "%Y%m%dT%H%M%SZ")
-        return dtime.replace(tzinfo=timezone.utc).astimezone(self._localtz)
+        if string in self._ics_datetimes:
+            return self._ics_datetimes[string]
+        # slicing is a lot faster than strptime for the fixed %Y%m%dT%H%M%SZ
+        dtime = datetime(
+            int(string[0:4]),
+            int(string[4:6]),
+            int(string[6:8]),
+            int(string[9:11]),
+            int(string[11:13]),
+            int(string[13:15]),
+            tzinfo=timezone.utc,
+        ).astimezone(self._localtz)
+        if len(self._ics_datetimes) >= 4096:
+            self._ics_datetimes.clear()
+        self._ics_datetimes[string] = dtime
+        return dtime
 
     @staticmethod
     def _tw_timestamp(dtime: datetime) -> str:
         if not isinstance(dtime, datetime):
             dtime = datetime.combine(dtime, time.min)
-        return dtime.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        dtime = dtime.astimezone(timezone.utc)
+        return (
+            f"{dtime.year:04}{dtime.month:02}{dtime.day:02}"
+            f"T{dtime.hour:02}{dtime.minute:02}{dtime.second:02}Z"
+        )
 
     def to_vobject_etag(self, project: str, uid: str) -> tuple[Component, str]:
         """Return iCal object and etag of one Taskwarrior entry.
@@ -130,9 +339,7 @@ class IcsTask:
 
         project = basename(filename)
         if project == "all_projects":
-            tasks = {
-                uuid: tasks[uuid] for tasks in self._tasks.values() for uuid in tasks
-            }
+            tasks = self._tasks_by_uuid
         else:
             if project not in self._tasks:
                 return []
@@ -141,12 +348,34 @@ class IcsTask:
         items = []
 
         for uid in uids:
+            task = tasks[uid.split("@")[0]]
             vtodos = iCalendar()
-            uuid = uid.split("@")[0]
-            self._gen_vtodo(tasks[uuid], vtodos.add("vtodo"))
-            items.append((uid, vtodos, f'"{tasks[uuid]["modified"]}"'))
+            self._gen_vtodo(task, vtodos.add("vtodo"))
+            items.append((uid, vtodos, f'"{task["modified"]}"'))
         return items
 
+    def _select_tasks(self, project: str = "", uid: str = "") -> list[dict[str, Any]]:
+        """Return the tasks to export for to_vobject() and to_vobject_iter()."""
+        self._update()
+
+        projects = self._tasks
+        tasks: Iterable[dict[str, Any]]
+        if uid:
+            uid = uid.split("@")[0]
+            if project:
+                tasks = [projects[basename(project)][uid]]
+            else:
+                tasks = [self._tasks_by_uuid[uid]]
+        elif project:
+            tasks = projects[basename(project)].values()
+        else:
+            tasks = chain.from_iterable(tsks.values() for tsks in projects.values())
+
+        # skip recurring instances in favor of the single parent task
+        return [
+            task for task in tasks if not (task.get("recur") and task.get("parent"))
+        ]
+
     def to_vobject(self, project: str = "", uid: str = "") -> Component:
         """Return vObject object of Taskwarrior tasks.
 
@@ -158,149 +387,96 @@ class IcsTask:
         project -- the Taskwarrior project
         uid -- the UID of the task
         """
-        self._update()
         vtodos = iCalendar()
 
-        tasks = []
-        if uid:
-            uid = uid.split("@")[0]
-            if not project:
-                for pro, tsks in self._tasks.items():
-                    if uid in tsks:
-                        project = pro
-                        break
-            tasks.append(self._tasks[basename(project)][uid])
-        elif project:
-            tasks = list(self._tasks[basename(project)].values())
-        else:
-            for tsks in self._tasks.values():
-                tasks.extend(tsks.values())
-
-        for task in tasks:
-            # skip recurring instances in favor of the single parent task
-            if task.get("recur") and task.get("parent"):
-                continue
+        for task in self._select_tasks(project, uid):
             self._gen_vtodo(task, vtodos.add("vtodo"))
 
         return vtodos
 
+    def to_vobject_iter(self, project: str = "", uid: str = "") -> Iterator[str]:
+        """Yield the serialized iCalendar of Taskwarrior tasks piece by piece.
+
+        Same selection as to_vobject(), but only one vTodo is kept in memory
+        at a time. The chunks concatenate to the serialized iCalendar.
+
+        project -- the Taskwarrior project
+        uid -- the UID of the task
+        """
+        tasks = self._select_tasks(project, uid)
+
+        calendar = iCalendar()
+        if TimezoneComponent.pickTzid(self._localtz):
+            calendar.add(TimezoneComponent(tzinfo=self._localtz))
+        footer = "END:VCALENDAR\r\n"
+        yield calendar.serialize()[: -len(footer)]
+
+        for task in tasks:
+            vtodo = iCalendar().add("vtodo")
+            self._gen_vtodo(task, vtodo)
+            yield vtodo.serialize()
+
+        yield footer
+
     @staticmethod
-    def _create_rset(recur: str, freq: int, postfix: str) -> rrule.rruleset:
+    @lru_cache(maxsize=64)
+    def _create_rset(recur: str) -> rrule.rruleset:
+        # few distinct recur strings, vobject only reads the returned rruleset
+        if recur in _RECUR_NAMES:
+            freq, interval = _RECUR_NAMES[recur], 1
+        else:
+            match = _RECUR_PERIOD.fullmatch(recur)
+            if not match or match[2] not in _RECUR_UNITS:
+                raise ValueError(f"Unsupported recurrence string {recur}")
+            freq, interval = _RECUR_UNITS[match[2]], int(match[1])
         rset = rrule.rruleset()
-        rset.rrule(rrule.rrule(freq=freq, interval=int(recur[: -len(postfix)])))
+        rset.rrule(rrule.rrule(freq=freq, interval=interval))
         return rset
 
     def _gen_vtodo(self, task: dict[str, Any], vtodo: Component) -> None:
         vtodo.add("uid").value = self._gen_uid(task["uuid"])
         vtodo.add("dtstamp").value = self._ics_datetime(task["entry"])
 
-        if "modified" in task:
-            vtodo.add("last-modified").value = self._ics_datetime(task["modified"])
+        if modified := task.get("modified"):
+            vtodo.add("last-modified").value = self._ics_datetime(modified)
 
-        if "start" in task:
-            vtodo.add("dtstart").value = self._ics_datetime(task["start"])
+        if start := task.get("start"):
+            vtodo.add("dtstart").value = self._ics_datetime(start)
 
-        if "due" in task:
-            due = self._ics_datetime(task["due"])
+        if due := task.get("due"):
+            due = self._ics_datetime(due)
             if due.time() == time():
                 vtodo.add("due").value = due.date()
             else:
                 vtodo.add("due").value = due
 
-        if "end" in task:
-            vtodo.add("completed").value = self._ics_datetime(task["end"])
+        if end := task.get("end"):
+            vtodo.add("completed").value = self._ics_datetime(end)
 
         vtodo.add("summary").value = task["description"]
 
-        if "tags" in task:
-            vtodo.add("categories").value = task["tags"]
+        if tags := task.get("tags"):
+            vtodo.add("categories").value = tags
 
-        if "priority" in task:
-            if task["priority"] == "H":
-                vtodo.add("priority").value = "1"
-            elif task["priority"] == "M":
-                vtodo.add("priority").value = "5"
-            elif task["priority"] == "L":
-                vtodo.add("priority").value = "9"
+        if priority := _ICS_PRIORITIES.get(task.get("priority", "")):
+            vtodo.add("priority").value = priority
 
-        if task["status"] in ("pending", "waiting"):
-            if "start" in task:
-                vtodo.add("status").value = "IN-PROCESS"
-            else:
-                vtodo.add("status").value = "NEEDS-ACTION"
-        elif task["status"] == "completed":
-            vtodo.add("status").value = "COMPLETED"
-        elif task["status"] == "deleted":
-            vtodo.add("status").value = "CANCELLED"
+        if status := _ICS_STATUSES.get(task["status"]):
+            if status == "NEEDS-ACTION" and start:
+                status = "IN-PROCESS"
+            vtodo.add("status").value = status
 
-        if "annotations" in task:
+        if annotations := task.get("annotations"):
             vtodo.add("description").value = "\n".join(
-                [annotation["description"] for annotation in task["annotations"]]
+                map(itemgetter("description"), annotations)
             )
 
-        if "recur" in task:
-            if task["recur"] == "daily":
-                rset = rrule.rruleset()
-                rset.rrule(rrule.rrule(freq=rrule.DAILY))
-                vtodo.rruleset = rset
-            elif task["recur"] == "weekly":
-                rset = rrule.rruleset()
-                rset.rrule(rrule.rrule(freq=rrule.WEEKLY))
-                vtodo.rruleset = rset
-            elif task["recur"] == "monthly":
-                rset = rrule.rruleset()
-                rset.rrule(rrule.rrule(freq=rrule.MONTHLY))
-                vtodo.rruleset = rset
-            elif task["recur"] == "yearly":
-                rset = rrule.rruleset()
-                rset.rrule(rrule.rrule(freq=rrule.YEARLY))
-                vtodo.rruleset = rset
-            elif task["recur"].endswith("days"):
-                vtodo.rruleset = IcsTask._create_rset(
-                    task["recur"], rrule.DAILY, "days"
-                )
-            elif task["recur"].endswith("w"):
-                vtodo.rruleset = IcsTask._create_rset(task["recur"], rrule.WEEKLY, "w")
-            elif task["recur"].endswith("week"):
-                vtodo.rruleset = IcsTask._create_rset(
-                    task["recur"], rrule.WEEKLY, "week"
-                )
-            elif task["recur"].endswith("weeks"):
-                vtodo.rruleset = IcsTask._create_rset(
-                    task["recur"], rrule.WEEKLY, "weeks"
-                )
-            elif task["recur"].endswith("mo"):
-                vtodo.rruleset = IcsTask._create_rset(
-                    task["recur"], rrule.MONTHLY, "mo"
-                )
-            elif task["recur"].endswith("month"):
-                vtodo.rruleset = IcsTask._create_rset(
-                    task["recur"], rrule.MONTHLY, "month"
-                )
-            elif task["recur"].endswith("months"):
-                vtodo.rruleset = IcsTask._create_rset(
-                    task["recur"], rrule.MONTHLY, "months"
-                )
-            elif task["recur"].endswith("y"):
-                vtodo.rruleset = IcsTask._create_rset(task["recur"], rrule.YEARLY, "y")
-            elif task["recur"].endswith("year"):
-                vtodo.rruleset = IcsTask._create_rset(
-                    task["recur"], rrule.YEARLY, "year"
-                )
-            elif task["recur"].endswith("years"):
-                vtodo.rruleset = IcsTask._create_rset(
-                    task["recur"], rrule.YEARLY, "years"
-                )
-            else:
-                raise ValueError(f'Unsupported recurrence string {task["recur"]}')
-
-    def to_task(self, vtodo: Component, project: str = "", uuid: str = "") -> str:
-        """Add or modify a task from vTodo to Taskwarrior.
+        if recur := task.get("recur"):
+            vtodo.rruleset = IcsTask._create_rset(recur)
 
-        vtodo -- the vTodo to add
-        project -- the project to add (see get_filesnames() as well)
-        uuid -- the UID of the task in Taskwarrior
-        """
+    def _vtodo_to_task(
+        self, vtodo: Component, project: str = "", uuid: str = ""
+    ) -> dict[str, Any]:
         task: dict[str, Any] = {}
 
         if project and project != "all_projects" and project != "unaffiliated":
@@ -309,28 +485,20 @@ class IcsTask:
         if uuid:
             task["uuid"] = uuid
 
-        if hasattr(vtodo, "dtstamp"):
-            task["entry"] = IcsTask._tw_timestamp(vtodo.dtstamp.value)
-
-        if hasattr(vtodo, "last_modified"):
-            task["modified"] = IcsTask._tw_timestamp(vtodo.last_modified.value)
-
-        if hasattr(vtodo, "dtstart"):
-            task["start"] = IcsTask._tw_timestamp(vtodo.dtstart.value)
-
-        if hasattr(vtodo, "due"):
-            task["due"] = IcsTask._tw_timestamp(vtodo.due.value)
+        # vobject resolves attribute access through exceptions, use the dict
+        contents = vtodo.contents
 
-        if hasattr(vtodo, "completed"):
-            task["end"] = IcsTask._tw_timestamp(vtodo.completed.value)
+        for name, key in _TW_DATES:
+            if name in contents:
+                task[key] = IcsTask._tw_timestamp(contents[name][0].value)
 
         task["description"] = vtodo.summary.value
 
-        if hasattr(vtodo, "categories"):
-            task["tags"] = vtodo.categories.value
+        if "categories" in contents:
+            task["tags"] = contents["categories"][0].value
 
-        if hasattr(vtodo, "priority"):
-            priority = int(vtodo.priority.value)
+        if "priority" in contents:
+            priority = int(contents["priority"][0].value)
             if priority < 3:
                 task["priority"] = "H"
             elif 3 < priority < 7:
@@ -338,41 +506,47 @@ class IcsTask:
             else:
                 task["priority"] = "L"
 
-        if hasattr(vtodo, "description"):
+        if "description" in contents:
+            # keep the timestamps of existing annotations, first one wins
+            existing = self._tasks_by_uuid.get(uuid, {})
+            stamps = {
+                annotation["description"]: annotation["entry"]
+                for annotation in reversed(existing.get("annotations", []))
+            }
             task["annotations"] = []
-            for delta, comment in enumerate(vtodo.description.value.split("\n")):
+            for delta, comment in enumerate(
+                contents["description"][0].value.split("\n")
+            ):
                 # Hack because Taskwarrior import doesn't accept multiple
                 # annotations with the same timestamp
-                stamp = IcsTask._tw_timestamp(
+                stamp = stamps.get(comment) or IcsTask._tw_timestamp(
                     vtodo.dtstamp.value + timedelta(seconds=delta)
                 )
-                if (
-                    uuid in self._tasks.get(project, {})
-                    and "annotations" in self._tasks[project][uuid]
-                ):
-                    for annotation in self._tasks[project][uuid]["annotations"]:
-                        if annotation["description"] == comment:
-                            stamp = annotation["entry"]
-                            break
                 task["annotations"].append({"entry": stamp, "description": comment})
 
-        if hasattr(vtodo, "status"):
-            if vtodo.status.value == "IN-PROCESS":
-                task["status"] = "pending"
-                if self._start_task and "start" not in task:
-                    task["start"] = IcsTask._tw_timestamp(vtodo.dtstamp.value)
-            elif vtodo.status.value == "NEEDS-ACTION":
-                task["status"] = "pending"
-            elif vtodo.status.value == "COMPLETED":
-                task["status"] = "completed"
-                if "end" not in task:
-                    task["end"] = IcsTask._tw_timestamp(vtodo.dtstamp.value)
-            elif vtodo.status.value == "CANCELLED":
-                task["status"] = "deleted"
-                if "end" not in task:
+        if "status" in contents:
+            ics_status = contents["status"][0].value
+            if status := _TW_STATUSES.get(ics_status):
+                task["status"] = status
+                if ics_status == "IN-PROCESS":
+                    if self._start_task and "start" not in task:
+                        task["start"] = IcsTask._tw_timestamp(vtodo.dtstamp.value)
+                elif status != "pending" and "end" not in task:
                     task["end"] = IcsTask._tw_timestamp(vtodo.dtstamp.value)
 
-        json = dumps(task, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+        return task
+
+    def _import(self, tasks: list[dict[str, Any]]) -> list[str]:
+        """Import tasks into Taskwarrior and return their UIDs."""
+        if not tasks:
+            return []
+
+        json = "\n".join(
+            [
+                dumps(task, separators=(",", ":"), ensure_ascii=False, sort_keys=True)
+                for task in tasks
+            ]
+        )
         with self._lock:
             out = check_output(
                 [
@@ -386,22 +560,39 @@ class IcsTask:
                 input=json,
                 text=True,
             )
-        uuid = findall(
-            "(?:add|mod)  ([0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}) ",
-            out,
-        )[0]
-        self._update()
-        return self._gen_uid(uuid)
+            self._reload(force=True)
+        uuids = _IMPORT_UUID.findall(out)
+        return [self._gen_uid(uuid) for uuid in uuids]
+
+    def to_task(self, vtodo: Component, project: str = "", uuid: str = "") -> str:
+        """Add or modify a task from vTodo to Taskwarrior.
+
+        vtodo -- the vTodo to add
+        project -- the project to add (see get_filesnames() as well)
+        uuid -- the UID of the task in Taskwarrior
+        """
+        return self._import([self._vtodo_to_task(vtodo, project, uuid)])[0]
+
+    def to_tasks(self, vtodos: Iterable[Component], project: str = "") -> list[str]:
+        """Add tasks from vTodos to Taskwarrior using a single import.
+
+        vtodos -- the vTodos to add
+        project -- the project to add (see get_filesnames() as well)
+        """
+        return self._import([self._vtodo_to_task(vtodo, project) for vtodo in vtodos])
 
     def get_filesnames(self) -> list[str]:
         """Return a list of all Taskwarrior projects as virtual files in the data directory."""
         self._update()
-        projects = sorted(set(
-            list(self._tasks.keys())
-            + self._task_projects
-            + ["all_projects", "unaffiliated"])
-        )
-        return [join(self._data_location, p.split()[0]) for p in projects]
+
+        lists = self._lists
+        key = ("filenames", "")
+        if key not in lists:
+            projects = sorted(
+                {*self._tasks, *self._task_projects, "all_projects", "unaffiliated"}
+            )
+            lists[key] = [join(self._data_location, p.split()[0]) for p in projects]
+        return list(lists[key])
 
     def get_uids(self, project: str = "") -> list[str]:
         """Return a list of UIDs.
@@ -411,16 +602,19 @@ class IcsTask:
         self._update()
 
         if not project or project.endswith("all_projects"):
-            return [
-                self._gen_uid(task["uuid"])
-                for tasks in self._tasks.values()
-                for task in tasks.values()
-            ]
-
-        if basename(project) not in self._tasks:
-            return []
+            project = "all_projects"
+        else:
+            project = basename(project)
 
-        return [self._gen_uid(uuid) for uuid in self._tasks[basename(project)]]
+        # _lists is reset after self._tasks and self._tasks_by_uuid are swapped
+        lists = self._lists
+        key = ("uids", project)
+        if key not in lists:
+            if project == "all_projects":
+                lists[key] = list(map(self._gen_uid, self._tasks_by_uuid))
+            else:
+                lists[key] = list(map(self._gen_uid, self._tasks.get(project, ())))
+        return list(lists[key])
 
     @staticmethod
     def get_meta() -> dict[str, str]:
@@ -460,6 +654,7 @@ class IcsTask:
                     "delete",
                 ]
             )
+            self._reload(force=True)
 
     def replace_vobject(self, uuid: str, vtodo: Component, project: str = "") -> str:
         """Update the task with the UID from the vObject.
@@ -492,6 +687,7 @@ class IcsTask:
                     f"project:{basename(to_project)}",
                 ]
             )
+            self._reload(force=True)
 
 
 def task2ics() -> None:
@@ -522,7 +718,7 @@ def task2ics() -> None:
         args.indir = None
 
     task = IcsTask(args.indir)
-    args.outfile.write(task.to_vobject().serialize())
+    args.outfile.writelines(task.to_vobject_iter())
 
 
 def ics2task() -> None:
@@ -550,5 +746,4 @@ def ics2task() -> None:
 
     vobject = readOne(args.infile.read())
     task = IcsTask(args.outdir)
-    for todo in vobject.vtodo_list:
-        task.to_task(todo)
+    task.to_tasks(vobject.vtodo_list)